@@ -1,5 +1,9 @@
-﻿import logging
-from typing import Dict, Any, Union
+﻿import asyncio
+import logging
+import random
+import time
+from typing import Dict, Any, List, Optional, Tuple, Union
+import httpx
 import requests
 from requests.exceptions import RequestException, HTTPError
 
@@ -10,6 +14,31 @@ logger = logging.getLogger(__name__)
 # Определяем точный тип возвращаемого словаря для лучшей типизации
 ResultDict = Dict[str, Union[str, Any]]
 
+# Описание одного PR для пакетного создания: owner, repo, head, base и необязательные title/body
+PRSpec = Dict[str, str]
+
+GITHUB_API_URL = 'https://api.github.com'
+DEFAULT_TITLE = 'Automated PR by Agent'
+
+# Максимальная пауза (сек) перед повтором; дольше ждать, удерживая слот пула, не имеет смысла
+MAX_RETRY_DELAY = 60.0
+
+# GitHub рекомендует ждать не меньше минуты после вторичного лимита без Retry-After
+SECONDARY_RATE_LIMIT_DELAY = 60.0
+
+REQUIRED_SPEC_KEYS = ('owner', 'repo', 'head', 'base')
+
+
+def _error_details(response: Any) -> str:
+    """Сообщение об ошибке из тела ответа GitHub; тело может быть не JSON (например, HTML от прокси)."""
+    try:
+        payload = response.json()
+    except ValueError:
+        return (response.text or '').strip()[:200] or 'Нет деталей ошибки'
+    if isinstance(payload, dict):
+        return payload.get('message', 'Нет деталей ошибки')
+    return 'Нет деталей ошибки'
+
 
 def propose_pr(
     owner: str,
@@ -17,7 +46,8 @@ def propose_pr(
     head: str,
     base: str,
     token: str,
-    title: str = "Automated PR by Agent"
+    title: str = DEFAULT_TITLE,
+    api_url: str = GITHUB_API_URL
 ) -> ResultDict:
     """
     Отправляет запрос на создание Pull Request в GitHub.
@@ -29,12 +59,13 @@ def propose_pr(
         base (str): Название ветки, в которую сливаем (target branch).
         token (str): Токен доступа GitHub.
         title (str): Заголовок Pull Request.
+        api_url (str): Базовый URL GitHub API.
 
     Returns:
         Dict: Словарь с ключами 'status' ('success'/'failure') и 'message',
               а также 'pr_url' при успехе.
     """
-    url = f'https://api.github.com/repos/{owner}/{repo}/pulls'
+    url = f'{api_url}/repos/{owner}/{repo}/pulls'
     headers = {
         'Authorization': f'token {token}',
         'Content-Type': 'application/json',
@@ -54,7 +85,7 @@ def propose_pr(
 
         if response.status_code >= 400:
             # Пытаемся получить сообщение об ошибке из тела ответа
-            error_details = response.json().get('message', 'Нет деталей ошибки')
+            error_details = _error_details(response)
             logger.error(f'❌ Ошибка при создании PR: HTTP {response.status_code}. Детали: {error_details}')
 
             # В случае ошибки GitHub часто возвращает 422 Unprocessable Entity
@@ -87,3 +118,213 @@ def propose_pr(
         # На всякий случай обрабатываем непредвиденные ошибки
         logger.error(f'❌ Неизвестная ошибка: {e}')
         return {'status': 'failure', 'message': f'Неизвестная ошибка: {e}'}
+
+
+def _is_retryable(response: httpx.Response) -> bool:
+    """5xx, 429 и лимиты GitHub (403 с Retry-After, исчерпанный лимит или 'secondary rate limit')."""
+    if response.status_code >= 500 or response.status_code == 429:
+        return True
+    if response.status_code == 403:
+        if 'retry-after' in response.headers or response.headers.get('x-ratelimit-remaining') == '0':
+            return True
+        return 'secondary rate limit' in _error_details(response).lower()
+    return False
+
+
+def _retry_delay(
+    response: Optional[httpx.Response],
+    attempt: int,
+    backoff_base: float,
+    max_delay: float
+) -> Optional[float]:
+    """
+    Пауза перед повтором: Retry-After от GitHub, до x-ratelimit-reset при
+    исчерпанном основном лимите, не меньше SECONDARY_RATE_LIMIT_DELAY при
+    вторичном лимите, иначе экспоненциальная задержка с полным джиттером.
+    None, если GitHub просит ждать дольше max_delay.
+    """
+    if response is not None:
+        retry_after = response.headers.get('retry-after')
+        if retry_after and retry_after.isdigit():
+            delay = float(retry_after)
+            return delay if delay <= max_delay else None
+        if response.headers.get('x-ratelimit-remaining') == '0':
+            reset = response.headers.get('x-ratelimit-reset', '')
+            if not reset.isdigit():
+                return None
+            delay = max(0.0, float(reset) - time.time()) + 1
+            return delay if delay <= max_delay else None
+        if response.status_code == 403 and 'secondary rate limit' in _error_details(response).lower():
+            return SECONDARY_RATE_LIMIT_DELAY if SECONDARY_RATE_LIMIT_DELAY <= max_delay else None
+    return min(random.uniform(0, backoff_base * 2 ** attempt), max_delay)  # nosec B311 - джиттер, не криптография
+
+
+async def _find_existing_pr(client: httpx.AsyncClient, spec: PRSpec) -> Optional[Dict[str, Any]]:
+    head = spec['head'] if ':' in spec['head'] else f"{spec['owner']}:{spec['head']}"
+    try:
+        response = await client.get(
+            f"/repos/{spec['owner']}/{spec['repo']}/pulls",
+            params={'head': head, 'base': spec['base'], 'state': 'open'}
+        )
+    except httpx.HTTPError as e:
+        logger.warning(f"⚠️ Не удалось найти существующий PR для {head}: {e}")
+        return None
+    if response.status_code != 200:
+        return None
+    try:
+        pulls = response.json()
+    except ValueError:
+        return None
+    return pulls[0] if isinstance(pulls, list) and pulls else None
+
+
+async def _propose_one(
+    client: httpx.AsyncClient,
+    semaphore: asyncio.Semaphore,
+    spec: PRSpec,
+    max_retries: int,
+    backoff_base: float,
+    max_retry_delay: float
+) -> ResultDict:
+    data = {
+        'head': spec['head'],
+        'base': spec['base'],
+        'title': spec.get('title', DEFAULT_TITLE)
+    }
+    if spec.get('body'):
+        data['body'] = spec['body']
+    target = f"{spec['owner']}/{spec['repo']} ({spec['head']} → {spec['base']})"
+
+    async with semaphore:
+        for attempt in range(max_retries + 1):
+            response: Optional[httpx.Response] = None
+            try:
+                response = await client.post(f"/repos/{spec['owner']}/{spec['repo']}/pulls", json=data)
+            except httpx.TransportError as e:
+                if attempt == max_retries:
+                    logger.error(f'❌ Сетевая ошибка при создании PR {target}: {e}')
+                    return {'status': 'failure', 'message': f'Сетевая ошибка: {e}'}
+                logger.warning(f'⚠️ Сетевая ошибка при создании PR {target}: {e}. Повтор...')
+            else:
+                if response.status_code < 400:
+                    try:
+                        response_json = response.json()
+                    except ValueError:
+                        response_json = {}
+                    return {
+                        'status': 'success',
+                        'message': 'PR создан успешно',
+                        'pr_url': response_json.get('html_url', 'N/A'),
+                        'pr_number': response_json.get('number', 'N/A')
+                    }
+
+                error_details = _error_details(response)
+                if response.status_code == 422 and 'already exists' in response.text:
+                    existing = await _find_existing_pr(client, spec)
+                    if existing is not None:
+                        logger.info(f'ℹ️ PR для {target} уже существует: {existing.get("html_url")}')
+                        return {
+                            'status': 'success',
+                            'message': 'PR уже существует',
+                            'pr_url': existing.get('html_url', 'N/A'),
+                            'pr_number': existing.get('number', 'N/A')
+                        }
+
+                if not _is_retryable(response) or attempt == max_retries:
+                    logger.error(f'❌ Ошибка при создании PR {target}: HTTP {response.status_code}. Детали: {error_details}')
+                    return {
+                        'status': 'failure',
+                        'message': f'Ошибка при создании PR: {response.status_code}. {error_details}'
+                    }
+                logger.warning(f'⚠️ HTTP {response.status_code} при создании PR {target}. Повтор...')
+
+            delay = _retry_delay(response, attempt, backoff_base, max_retry_delay)
+            if delay is None:
+                status = response.status_code if response is not None else 'N/A'
+                logger.error(f'❌ Лимит GitHub API для PR {target}: ожидание дольше {max_retry_delay} сек, повтор отменён.')
+                return {
+                    'status': 'failure',
+                    'message': f'Ошибка при создании PR: {status}. Лимит GitHub API исчерпан, повторите позже'
+                }
+            await asyncio.sleep(delay)
+
+    return {'status': 'failure', 'message': 'Исчерпаны попытки создания PR'}
+
+
+async def propose_prs_async(
+    specs: List[PRSpec],
+    token: str,
+    max_concurrency: int = 4,
+    max_retries: int = 3,
+    backoff_base: float = 1.0,
+    timeout: float = 10.0,
+    api_url: str = GITHUB_API_URL,
+    max_retry_delay: float = MAX_RETRY_DELAY
+) -> List[ResultDict]:
+    """
+    Создаёт несколько Pull Request параллельно через общий пул соединений.
+
+    Args:
+        specs (List[Dict]): Описания PR с ключами 'owner', 'repo', 'head', 'base'
+                            и необязательными 'title', 'body'.
+        token (str): Токен доступа GitHub.
+        max_concurrency (int): Максимум одновременных запросов к GitHub.
+        max_retries (int): Число повторов при 5xx, 429 и вторичных лимитах.
+        backoff_base (float): Базовая задержка (сек) экспоненциального бэкоффа.
+        timeout (float): Таймаут одного HTTP-запроса (сек).
+        api_url (str): Базовый URL GitHub API.
+        max_retry_delay (float): Максимальная пауза перед повтором (сек); если
+                                 GitHub просит ждать дольше, PR считается неудачным.
+
+    Returns:
+        List[Dict]: Результаты в порядке specs, в формате propose_pr.
+                    Уже открытый PR для той же пары веток считается успехом,
+                    описание без обязательных полей — неудачей без запроса к GitHub.
+    """
+    headers = {
+        'Authorization': f'token {token}',
+        'Accept': 'application/vnd.github.v3+json'
+    }
+    limits = httpx.Limits(max_connections=max_concurrency, max_keepalive_connections=max_concurrency)
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    # Одинаковые спецификации в пакете отправляются один раз; некорректные не отправляются вовсе
+    unique: Dict[Tuple[str, str, str, str], PRSpec] = {}
+    invalid: Dict[int, ResultDict] = {}
+    for index, spec in enumerate(specs):
+        fields = spec if isinstance(spec, dict) else {}
+        missing = [key for key in REQUIRED_SPEC_KEYS if not isinstance(fields.get(key), str) or not fields.get(key)]
+        if missing:
+            logger.error(f'❌ Некорректное описание PR #{index}: нет полей {", ".join(missing)}')
+            invalid[index] = {'status': 'failure', 'message': f'Некорректное описание PR: нет полей {", ".join(missing)}'}
+            continue
+        unique.setdefault((spec['owner'], spec['repo'], spec['head'], spec['base']), spec)
+
+    async with httpx.AsyncClient(base_url=api_url, headers=headers, limits=limits, timeout=timeout) as client:
+        outcomes = await asyncio.gather(
+            *(
+                _propose_one(client, semaphore, spec, max_retries, backoff_base, max_retry_delay)
+                for spec in unique.values()
+            ),
+            return_exceptions=True
+        )
+
+    # Непредвиденная ошибка одного PR не должна терять результаты остальных
+    results: List[ResultDict] = []
+    for key, outcome in zip(unique.keys(), outcomes):
+        if isinstance(outcome, BaseException):
+            logger.error(f'❌ Неизвестная ошибка при создании PR {key[0]}/{key[1]} ({key[2]}): {outcome}')
+            results.append({'status': 'failure', 'message': f'Неизвестная ошибка: {outcome}'})
+        else:
+            results.append(outcome)
+
+    by_key = dict(zip(unique.keys(), results))
+    return [
+        invalid[index] if index in invalid else by_key[(spec['owner'], spec['repo'], spec['head'], spec['base'])]
+        for index, spec in enumerate(specs)
+    ]
+
+
+def propose_prs(specs: List[PRSpec], token: str, **kwargs: Any) -> List[ResultDict]:
+    """Синхронная обёртка над propose_prs_async для вызова вне event loop."""
+    return asyncio.run(propose_prs_async(specs, token, **kwargs))
@@ -0,0 +1,216 @@
+import json
+import logging
+import posixpath
+import re
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+VALID_ACTIONS = ('create', 'modify', 'delete')
+
+# Ключи, под которыми модели с response_format=json_object прячут массив изменений
+WRAPPER_KEYS = ('changes', 'files', 'edits', 'patches')
+
+_FENCE_RE = re.compile(r"```(?:json)?[ \t]*\n?(.*?)(?:```|$)", re.DOTALL | re.IGNORECASE)
+# Жадный вариант — так ответ разбирал прежний parse_model_response
+_GREEDY_FENCE_RE = re.compile(r"```(?:json)?\s*(.*)```", re.DOTALL | re.IGNORECASE)
+_FENCE_OPEN_RE = re.compile(r"```(?:json)?", re.IGNORECASE)
+_CLOSERS = {'[': ']', '{': '}'}
+_CONTROL_ESCAPES = {'\n': '\\n', '\r': '\\r', '\t': '\\t'}
+
+
+def _find_json_start(text: str) -> int:
+    positions = [pos for pos in (text.find('['), text.find('{')) if pos != -1]
+    return min(positions) if positions else -1
+
+
+def _baseline_parses(content: str) -> bool:
+    """Справился бы прежний разбор (жадный ```-regex + json.loads + массив) без ремонта."""
+    text = content.strip()
+    match = _GREEDY_FENCE_RE.search(text)
+    if match:
+        text = match.group(1).strip()
+    try:
+        return isinstance(json.loads(text), list)
+    except json.JSONDecodeError:
+        return False
+
+
+def _strict_candidates(content: str) -> Iterator[str]:
+    """Весь ответ, жадное содержимое ```-блока и содержимое каждого ```-блока по отдельности."""
+    yield content.strip()
+    match = _GREEDY_FENCE_RE.search(content)
+    if match:
+        yield match.group(1).strip()
+    for match in _FENCE_RE.finditer(content):
+        yield match.group(1).strip()
+
+
+def _repair_candidates(content: str) -> Iterator[str]:
+    """Текст после первого открывающего ``` (скобки в преамбуле не мешают), затем весь ответ."""
+    match = _FENCE_OPEN_RE.search(content)
+    if match:
+        yield content[match.end():]
+    yield content
+
+
+def _drop_trailing_comma(out: List[str]) -> None:
+    j = len(out) - 1
+    while j >= 0 and out[j].isspace():
+        j -= 1
+    if j >= 0 and out[j] == ',':
+        del out[j]
+
+
+def repair_json(text: str) -> str:
+    """
+    Чинит типичные дефекты JSON от LLM за один проход по символам:
+    неэкранированные управляющие символы в строках, висячие запятые,
+    текст после JSON и обрыв ответа (последний незавершённый элемент
+    отбрасывается, скобки закрываются).
+
+    Raises:
+        ValueError: если JSON не найден или от него нечего спасти.
+    """
+    start = _find_json_start(text)
+    if start == -1:
+        raise ValueError('JSON не найден в ответе модели')
+
+    out: List[str] = []
+    stack: List[str] = []
+    in_string = False
+    escaped = False
+    # Последняя точка, где целиком завершился объект внутри массива
+    cut: Optional[Tuple[int, List[str]]] = None
+
+    for ch in text[start:]:
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == '\\':
+                escaped = True
+            elif ch == '"':
+                in_string = False
+            elif ch < ' ':
+                out.append(_CONTROL_ESCAPES.get(ch, f'\\u{ord(ch):04x}'))
+                continue
+            out.append(ch)
+            continue
+
+        if ch == '"':
+            in_string = True
+        elif ch in _CLOSERS:
+            stack.append(ch)
+        elif ch in ']}':
+            _drop_trailing_comma(out)
+            if stack:
+                stack.pop()
+            out.append(ch)
+            if not stack:
+                return ''.join(out)
+            if ch == '}' and stack[-1] == '[':
+                cut = (len(out), list(stack))
+            continue
+        out.append(ch)
+
+    if cut is None:
+        raise ValueError('Ответ модели оборван до первого завершённого изменения')
+
+    length, open_brackets = cut
+    logger.warning('⚠️ Ответ модели оборван, последний незавершённый элемент отброшен.')
+    return ''.join(out[:length]) + ''.join(_CLOSERS[b] for b in reversed(open_brackets))
+
+
+def _unwrap(data: Any) -> Any:
+    if not isinstance(data, dict):
+        return data
+    if 'file' in data:
+        return [data]
+    for key in WRAPPER_KEYS:
+        if isinstance(data.get(key), list):
+            return data[key]
+    lists = [value for value in data.values() if isinstance(value, list)]
+    if len(lists) == 1:
+        return lists[0]
+    return data
+
+
+def _is_safe_path(file_path: str) -> bool:
+    """Путь относительный и не выходит за корень репозитория."""
+    normalized = posixpath.normpath(file_path.replace('\\', '/'))
+    return not (normalized.startswith('/') or normalized == '..' or normalized.startswith('../') or normalized == '.')
+
+
+def validate_changes(data: Any) -> List[Dict[str, Any]]:
+    """
+    Проверяет схему изменений: 'file' — непустая строка, 'action' — одно из
+    VALID_ACTIONS, 'content' — строка (для 'delete' может отсутствовать).
+    Пути вне репозитория ('../x.py', абсолютные) отклоняются.
+    Некорректные элементы отбрасываются с предупреждением.
+
+    Raises:
+        ValueError: если это не массив или в нём нет ни одного корректного изменения.
+    """
+    if not isinstance(data, list):
+        raise ValueError(f'Ожидался массив изменений, получен {type(data).__name__}')
+
+    changes = []
+    for index, item in enumerate(data):
+        if not isinstance(item, dict):
+            logger.warning(f'⚠️ Изменение #{index} не является объектом, пропущено.')
+            continue
+        file_path = item.get('file')
+        action = item.get('action')
+        content = item.get('content', '' if action == 'delete' else None)
+        if not isinstance(file_path, str) or not file_path:
+            logger.warning(f'⚠️ Изменение #{index}: некорректное поле file, пропущено.')
+            continue
+        if not _is_safe_path(file_path):
+            logger.warning(f'⚠️ Изменение #{index}: недопустимый путь {file_path!r} вне репозитория, пропущено.')
+            continue
+        if action not in VALID_ACTIONS:
+            logger.warning(f'⚠️ Изменение #{index} ({file_path}): неизвестное действие {action!r}, пропущено.')
+            continue
+        if not isinstance(content, str):
+            logger.warning(f'⚠️ Изменение #{index} ({file_path}): некорректное поле content, пропущено.')
+            continue
+        changes.append({'file': file_path, 'action': action, 'content': content})
+
+    if not changes:
+        raise ValueError('В ответе модели нет ни одного корректного изменения')
+    return changes
+
+
+def parse_changes(content: str) -> Tuple[List[Dict[str, Any]], bool]:
+    """
+    Извлекает и валидирует массив изменений из ответа модели.
+
+    Сначала пробует строгий json.loads для всего ответа и содержимого
+    ```-блоков; если ни один не дал массив (или обёртку с ним), применяет
+    локальный ремонт.
+
+    Returns:
+        Tuple: (список изменений, True если прежний разбор parse_model_response
+               на этом ответе не справился бы и модель была бы пропущена).
+
+    Raises:
+        ValueError: если ответ не удалось ни разобрать, ни починить.
+    """
+    repaired = not _baseline_parses(content)
+
+    for candidate in _strict_candidates(content):
+        try:
+            data = _unwrap(json.loads(candidate))
+        except json.JSONDecodeError:
+            continue
+        if isinstance(data, list):
+            return validate_changes(data), repaired
+
+    logger.info('🔧 Строгий разбор JSON не удался, пробую ремонт...')
+    last_error = ValueError('JSON не найден в ответе модели')
+    for candidate in _repair_candidates(content):
+        try:
+            return validate_changes(_unwrap(json.loads(repair_json(candidate)))), True
+        except ValueError as e:
+            last_error = e
+    raise last_error
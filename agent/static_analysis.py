@@ -0,0 +1,300 @@
+import asyncio
+import hashlib
+import importlib.util
+import logging
+import os
+import shutil
+import sys
+import tarfile
+import tempfile
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# Корень локальной копии бота
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Постоянный каталог для инкрементального кэша mypy (.mypy_cache уже в .gitignore)
+MYPY_CACHE_DIR = os.path.join(PROJECT_ROOT, '.mypy_cache', 'agent')
+
+# Распакованные снимки целевого репозитория: <BASE_TREES_DIR>/<commit sha>
+BASE_TREES_DIR = os.path.join(tempfile.gettempdir(), 'agent-analysis-bases')
+MAX_BASE_TREES = 4
+
+ANALYSIS_TIMEOUT = 120.0
+MAX_CACHE_ENTRIES = 256
+
+# Что не копируется из снимка во временный каталог анализа
+_COPY_IGNORE = shutil.ignore_patterns(
+    '.git', '.mypy_cache', '.pytest_cache', '__pycache__', '*.py[cod]',
+    'venv', '.venv', '.tox', '.nox', '.env', '*.log'
+)
+
+ToolResult = Dict[str, Any]
+AnalysisReport = Dict[str, Any]
+
+# LRU-кэш результатов: (инструмент, sha базового коммита, sha256 изменений) -> результат
+_RESULT_CACHE: OrderedDict[Tuple[str, str, str], ToolResult] = OrderedDict()
+
+
+def _tool_commands(workdir: str, files: List[str]) -> Dict[str, List[str]]:
+    """
+    Команды запуска flake8, mypy и bandit. flake8 и mypy сами находят
+    setup.cfg/mypy.ini целевого репозитория в workdir, bandit.yaml передаётся явно.
+    """
+    bandit_config = os.path.join(workdir, 'bandit.yaml')
+    return {
+        'flake8': [sys.executable, '-m', 'flake8', *files],
+        'mypy': [
+            sys.executable, '-m', 'mypy',
+            '--cache-dir', MYPY_CACHE_DIR,
+            '--incremental',
+            '--explicit-package-bases',
+            '--no-error-summary',
+            *files
+        ],
+        'bandit': [
+            sys.executable, '-m', 'bandit',
+            '-q',
+            *(['-c', bandit_config] if os.path.isfile(bandit_config) else []),
+            *files
+        ],
+    }
+
+
+def ensure_final_newlines(changes: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Добавляет завершающий перевод строки в непустой content, где его нет (W292 и т.п.)."""
+    normalized = []
+    for change in changes:
+        content = change.get('content')
+        if change.get('action') != 'delete' and isinstance(content, str) and content and not content.endswith('\n'):
+            change = {**change, 'content': content + '\n'}
+        normalized.append(change)
+    return normalized
+
+
+def format_failures(report: AnalysisReport, limit: int = 1500) -> str:
+    """Текст замечаний упавших инструментов для пользователя."""
+    parts = [
+        f'{name}:\n{result["output"]}'
+        for name, result in report['tools'].items()
+        if not result['passed']
+    ]
+    text = '\n\n'.join(parts)
+    return text if len(text) <= limit else text[:limit] + '\n...'
+
+
+def _python_changes(changes: List[Dict[str, Any]]) -> Dict[str, str]:
+    """Отбирает .py-файлы, которые создаются или изменяются (удаления не анализируем)."""
+    sources: Dict[str, str] = {}
+    for change in changes:
+        file_path = change.get('file')
+        content = change.get('content')
+        if change.get('action') == 'delete' or not isinstance(file_path, str) or not isinstance(content, str):
+            continue
+        if file_path.endswith('.py'):
+            sources[file_path] = content
+    return sources
+
+
+def content_hash(sources: Dict[str, str]) -> str:
+    digest = hashlib.sha256()
+    for file_path in sorted(sources):
+        digest.update(file_path.encode('utf-8'))
+        digest.update(b'\0')
+        digest.update(sources[file_path].encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def _extract_tarball(archive_path: str, target: str) -> None:
+    """Распаковывает архив GitHub без верхнего каталога owner-repo-sha; ссылки и пути наружу пропускаются."""
+    with tarfile.open(archive_path, 'r:gz') as tar:
+        for member in tar.getmembers():
+            parts = member.name.split('/', 1)
+            if len(parts) < 2 or not parts[1]:
+                continue
+            relative = os.path.normpath(parts[1])
+            if relative.startswith('..') or os.path.isabs(relative):
+                continue
+            destination = os.path.join(target, relative)
+            if member.isdir():
+                os.makedirs(destination, exist_ok=True)
+            elif member.isfile():
+                source = tar.extractfile(member)
+                if source is None:
+                    continue
+                os.makedirs(os.path.dirname(destination), exist_ok=True)
+                with source, open(destination, 'wb') as f:
+                    shutil.copyfileobj(source, f)
+
+
+def _prune_base_trees() -> None:
+    trees = sorted(
+        (os.path.join(BASE_TREES_DIR, name) for name in os.listdir(BASE_TREES_DIR) if '.' not in name),
+        key=os.path.getmtime
+    )
+    for path in trees[:-MAX_BASE_TREES]:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+async def fetch_base_tree(archive_url: str, base_sha: str) -> str:
+    """
+    Скачивает tarball целевого репозитория на коммите base_sha (ссылка из
+    repo.get_archive_link) и распаковывает в BASE_TREES_DIR/<sha>.
+    Снимок переиспользуется, хранятся последние MAX_BASE_TREES.
+
+    Returns:
+        str: Путь к распакованному дереву.
+    """
+    target = os.path.join(BASE_TREES_DIR, base_sha)
+    if os.path.isdir(target):
+        os.utime(target)
+        return target
+
+    os.makedirs(BASE_TREES_DIR, exist_ok=True)
+    with tempfile.TemporaryDirectory(dir=BASE_TREES_DIR, suffix='.tmp') as staging:
+        archive_path = os.path.join(staging, 'base.tar.gz')
+        async with httpx.AsyncClient(timeout=60.0, follow_redirects=True) as client:
+            async with client.stream('GET', archive_url) as response:
+                response.raise_for_status()
+                with open(archive_path, 'wb') as f:
+                    async for chunk in response.aiter_bytes():
+                        f.write(chunk)
+
+        tree = os.path.join(staging, 'tree')
+        loop = asyncio.get_event_loop()
+        await loop.run_in_executor(None, _extract_tarball, archive_path, tree)
+        try:
+            os.replace(tree, target)
+        except OSError:
+            # Параллельная задача уже распаковала этот же коммит
+            if not os.path.isdir(target):
+                raise
+
+    _prune_base_trees()
+    logger.info(f'📦 Снимок целевого репозитория {base_sha[:7]} подготовлен для анализа.')
+    return target
+
+
+def _prepare_workdir(workdir: str, base_dir: str, sources: Dict[str, str]) -> List[str]:
+    """
+    Копирует снимок целевого репозитория во workdir и накладывает поверх
+    изменённые файлы, чтобы импорты между модулями проверялись по-настоящему.
+    Возвращает пути изменённых файлов относительно корня репозитория.
+    """
+    shutil.copytree(base_dir, workdir, ignore=_COPY_IGNORE, dirs_exist_ok=True)
+    paths = []
+    for file_path, content in sources.items():
+        relative = os.path.normpath(file_path).lstrip(os.sep)
+        if relative.startswith('..'):
+            raise ValueError(f'Недопустимый путь файла: {file_path}')
+        target = os.path.join(workdir, relative)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with open(target, 'w', encoding='utf-8') as f:
+            f.write(content)
+        paths.append(relative)
+    return paths
+
+
+async def _run_tool(name: str, cmd: List[str], cwd: str) -> ToolResult:
+    if importlib.util.find_spec(name) is None:
+        logger.warning(f'⚠️ {name} не установлен, проверка пропущена.')
+        return {'passed': True, 'skipped': True, 'finished': False, 'output': ''}
+
+    proc = await asyncio.create_subprocess_exec(
+        *cmd,
+        cwd=cwd,
+        env={**os.environ, 'MYPYPATH': cwd},
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.STDOUT
+    )
+    try:
+        stdout, _ = await asyncio.wait_for(proc.communicate(), timeout=ANALYSIS_TIMEOUT)
+    except asyncio.TimeoutError:
+        proc.kill()
+        await proc.wait()
+        return {
+            'passed': False,
+            'skipped': False,
+            'finished': False,
+            'output': f'{name}: превышен таймаут {ANALYSIS_TIMEOUT} сек'
+        }
+
+    return {
+        'passed': proc.returncode == 0,
+        'skipped': False,
+        'finished': True,
+        'output': stdout.decode('utf-8', errors='replace').strip()
+    }
+
+
+def _cache_get(key: Tuple[str, str, str]) -> Optional[ToolResult]:
+    result = _RESULT_CACHE.get(key)
+    if result is not None:
+        _RESULT_CACHE.move_to_end(key)
+    return result
+
+
+def _cache_put(key: Tuple[str, str, str], result: ToolResult) -> None:
+    _RESULT_CACHE[key] = result
+    _RESULT_CACHE.move_to_end(key)
+    while len(_RESULT_CACHE) > MAX_CACHE_ENTRIES:
+        _RESULT_CACHE.popitem(last=False)
+
+
+async def analyze_changes(changes: List[Dict[str, Any]], base_dir: str, base_sha: str) -> AnalysisReport:
+    """
+    Запускает flake8, mypy и bandit только по файлам из предложенных изменений.
+
+    Изменения накладываются на копию целевого репозитория (base_dir — снимок
+    на коммите base_sha, см. fetch_base_tree), его же конфиги используются
+    для проверок. Инструменты работают параллельно в отдельных процессах,
+    mypy использует инкрементальный кэш, а результаты завершившихся проверок
+    кэшируются по sha базового коммита и хэшу содержимого файлов.
+
+    Returns:
+        Dict: 'passed' (bool), 'duration' (сек), 'tools' — результаты по
+              каждому инструменту с ключами 'passed', 'skipped', 'finished',
+              'cached', 'output'.
+    """
+    started = time.monotonic()
+    sources = _python_changes(changes)
+    report: AnalysisReport = {'passed': True, 'duration': 0.0, 'tools': {}}
+    if not sources:
+        return report
+
+    key = content_hash(sources)
+    tools: Dict[str, ToolResult] = {}
+    pending: List[str] = []
+    for name in ('flake8', 'mypy', 'bandit'):
+        cached = _cache_get((name, base_sha, key))
+        if cached is not None:
+            tools[name] = {**cached, 'cached': True}
+        else:
+            pending.append(name)
+
+    if pending:
+        os.makedirs(MYPY_CACHE_DIR, exist_ok=True)
+        with tempfile.TemporaryDirectory(prefix='agent-analysis-') as workdir:
+            files = _prepare_workdir(workdir, base_dir, sources)
+            commands = _tool_commands(workdir, files)
+            results = await asyncio.gather(
+                *(_run_tool(name, commands[name], workdir) for name in pending)
+            )
+        for name, result in zip(pending, results):
+            if result['finished']:
+                _cache_put((name, base_sha, key), result)
+            tools[name] = {**result, 'cached': False}
+
+    report['tools'] = tools
+    report['passed'] = all(result['passed'] for result in tools.values())
+    report['duration'] = time.monotonic() - started
+
+    for name, result in tools.items():
+        if not result['passed']:
+            logger.warning(f'⚠️ {name} нашёл проблемы:\n{result["output"][:1000]}')
+    return report
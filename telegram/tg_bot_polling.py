@@ -1,7 +1,5 @@
 import asyncio
 import time
-import json
-import re
 import logging
 import sys
 import os
@@ -13,6 +11,12 @@ from github import Github, GithubException, RateLimitExceededException
 from typing import List, Dict, Any, Tuple
 from functools import partial
 
+# Корень проекта добавляется в конец sys.path, чтобы пакет agent был доступен,
+# а локальный каталог telegram не перекрывал библиотеку python-telegram-bot.
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from agent.json_repair import parse_changes  # noqa: E402
+from agent.static_analysis import analyze_changes, ensure_final_newlines, fetch_base_tree, format_failures  # noqa: E402
+
 load_dotenv()
 
 logging.basicConfig(
@@ -58,6 +62,7 @@ MODEL_CHAIN = [
 
 START_TIME = time.time()
 PROCESSED_ISSUES_COUNT = 0
+REPAIRED_RESPONSES_COUNT = 0
 BOT_VERSION = "v0.1.0"
 
 
@@ -147,17 +152,17 @@ async def create_branch(repo, base_branch: str, new_branch_name: str):
         raise
 
 
-def parse_model_response(content: str) -> str:
-    content = content.strip()
-    match = re.search(r"```(?:json)?\s*(.*)```", content, re.DOTALL | re.IGNORECASE)
-    if match:
-        content = match.group(1).strip()
-    if content.startswith('[') and content.endswith(']'):
-        return content
-    return content
+async def prepare_analysis_base(repo, base_branch: str) -> Tuple[str, str]:
+    """Снимок REPO_NAME на голове base_branch для статического анализа: (путь, sha коммита)."""
+    loop = asyncio.get_event_loop()
+    branch = await loop.run_in_executor(None, partial(repo.get_branch, base_branch))
+    base_sha = branch.commit.sha
+    archive_url = await loop.run_in_executor(None, partial(repo.get_archive_link, "tarball", base_sha))
+    base_dir = await fetch_base_tree(archive_url, base_sha)
+    return base_dir, base_sha
 
 
-async def call_openrouter(issue, files_list) -> Tuple[List[Dict[str, Any]], str]:
+async def call_openrouter(issue, files_list, base_dir: str, base_sha: str) -> Tuple[List[Dict[str, Any]], str, float]:
     if not MODEL_CHAIN:
         raise Exception("❌ Цепочка моделей пуста! Добавьте модели в MODEL_CHAIN.")
 
@@ -184,9 +189,13 @@ async def call_openrouter(issue, files_list) -> Tuple[List[Dict[str, Any]], str]
 """
     openrouter_url = "[https://openrouter.ai/api/v1/chat/completions](https://openrouter.ai/api/v1/chat/completions)"
 
+    analysis_time = 0.0
+    last_analysis_failure = ""
+
     async with httpx.AsyncClient(timeout=180.0) as client:
         for model in MODEL_CHAIN:
             logger.info(f"⏳ Попытка вызова модели: {model}...")
+            content: str = ""
 
             try:
                 request_data: Dict[str, Any] = {
@@ -211,25 +220,39 @@ async def call_openrouter(issue, files_list) -> Tuple[List[Dict[str, Any]], str]
                 resp.raise_for_status()
 
                 data = resp.json()
-                content: str = data.get("choices", [{}])[0].get("message", {}).get("content", "")
+                content = data.get("choices", [{}])[0].get("message", {}).get("content", "")
 
                 if not content:
                     logger.warning(f"⚠️ Модель {model} вернула **пустой** ответ. Переход к следующей.")
                     continue
 
-                clean_content = parse_model_response(content)
-                changes = json.loads(clean_content)
+                changes, repaired = parse_changes(content)
+                changes = ensure_final_newlines(changes)
 
-                if not isinstance(changes, list):
-                    logger.warning(f"⚠️ Модель {model} вернула JSON, но это не массив. Переход к следующей.")
+                try:
+                    report = await analyze_changes(changes, base_dir, base_sha)
+                except (OSError, ValueError) as e:
+                    logger.warning(f"⚠️ Не удалось проанализировать изменения от модели {model}: {e}. Переход к следующей.")
+                    continue
+                analysis_time += report['duration']
+                if not report['passed']:
+                    failed_tools = ', '.join(name for name, result in report['tools'].items() if not result['passed'])
+                    logger.warning(f"⚠️ Изменения от модели {model} не прошли статический анализ ({failed_tools}). Переход к следующей.")
+                    last_analysis_failure = f"{model} ({failed_tools}):\n{format_failures(report)}"
                     continue
 
+                if repaired:
+                    global REPAIRED_RESPONSES_COUNT
+                    REPAIRED_RESPONSES_COUNT += 1
+                    logger.info(f"🔧 Ответ модели {model} спасён локальным ремонтом JSON (всего: {REPAIRED_RESPONSES_COUNT})")
+
                 logger.info(f"✅ Успешно: Получен валидный ответ от модели **{model}**")
-                return changes, model
+                logger.info(f"🔎 Статический анализ занял {analysis_time:.2f} сек")
+                return changes, model, analysis_time
 
-            except json.JSONDecodeError as e:
-                logger.warning(f"⚠️ Модель {model} вернула **невалидный JSON**. Ошибка: {e}")
-                logger.debug(f"Полученный контент (первые 200 символов): {clean_content[:200]}...")
+            except ValueError as e:
+                logger.warning(f"⚠️ Модель {model} вернула **невалидный JSON**, ремонт не помог. Ошибка: {e}")
+                logger.debug(f"Полученный контент (первые 200 символов): {content[:200]}...")
                 continue
             except httpx.HTTPStatusError as e:
                 error_text = e.response.text[:500] if e.response.text else "нет текста ошибки"
@@ -242,6 +265,8 @@ async def call_openrouter(issue, files_list) -> Tuple[List[Dict[str, Any]], str]
                 logger.error(f"⚠️ Неизвестная ошибка при работе с моделью {model}: {type(e).__name__}: {e}")
                 continue
 
+    if last_analysis_failure:
+        raise Exception(f"❌ Ни один ответ моделей не прошёл статический анализ. Последний отказ — {last_analysis_failure}")
     raise Exception("❌ Все модели в цепочке недоступны или вернули ошибки.")
 
 
@@ -277,6 +302,7 @@ async def internal_status_command(update: Update, context: ContextTypes.DEFAULT_
     status_text = f"Агент {BOT_VERSION}\n"
     status_text += f"Uptime: {uptime_str}\n"
     status_text += f"Обработано задач: {PROCESSED_ISSUES_COUNT}\n"
+    status_text += f"Ответов спасено ремонтом JSON: {REPAIRED_RESPONSES_COUNT}\n"
     status_text += "Режим: <b>polling (VPS)</b>\n"
     status_text += "Готов к работе ✅"
 
@@ -320,6 +346,8 @@ async def run_issue_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
             return
 
         files_list = await get_repo_files(repo)
+        base_branch = repo.default_branch
+        base_dir, base_sha = await prepare_analysis_base(repo, base_branch)
 
         await context.bot.edit_message_text(
             chat_id=message.chat_id,
@@ -328,9 +356,8 @@ async def run_issue_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
             parse_mode='HTML'
         )
 
-        changes, model_used = await call_openrouter(issue, files_list)
+        changes, model_used, analysis_time = await call_openrouter(issue, files_list, base_dir, base_sha)
 
-        base_branch = repo.default_branch
         new_branch_name = f"agent-fix-issue-{issue_number}"
         commit_message = f"Fix: #{issue_number} - {issue.title}"
 
@@ -433,7 +460,8 @@ async def run_issue_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
         result_text = f"✅ Задача <b>#{issue_number}</b> выполнена и интегрирована!\n"
         result_text += f"🤖 Модель: <b>{escape_html(model_used)}</b>\n"
-        result_text += f"📝 Коммитов: <b>{len(changes)}</b>\n\n"
+        result_text += f"📝 Коммитов: <b>{len(changes)}</b>\n"
+        result_text += f"🔎 Статический анализ: <b>{analysis_time:.2f} сек</b>\n\n"
         result_text += "<b>Pull Request создан!</b>\n"
         result_text += f"🔗 <a href='{pull_request.html_url}'>Перейти к PR #{pull_request.number}</a>"
 
@@ -480,13 +508,16 @@ async def test_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     mock_files = ["README.md"]
 
     try:
-        changes, model_used = await call_openrouter(mock_issue, mock_files)
+        repo = await get_repo_with_wait(REPO_NAME)
+        base_dir, base_sha = await prepare_analysis_base(repo, repo.default_branch)
+        changes, model_used, analysis_time = await call_openrouter(mock_issue, mock_files, base_dir, base_sha)
 
         escaped_model_used = escape_html(model_used)
 
         result_text = "✅ Успешно!\n\n"
         result_text += f"🤖 Модель: <b>{escaped_model_used}</b>\n"
-        result_text += f"📝 Изменений: <b>{len(changes)}</b>\n\n"
+        result_text += f"📝 Изменений: <b>{len(changes)}</b>\n"
+        result_text += f"🔎 Статический анализ: <b>{analysis_time:.2f} сек</b>\n\n"
         result_text += "<b>Предложенные файлы:</b>\n"
 
         for change in changes:
@@ -0,0 +1,69 @@
+import json
+import unittest
+
+from agent.json_repair import parse_changes
+
+
+class TestParseChanges(unittest.TestCase):
+    def test_valid_array_needs_no_repair(self) -> None:
+        changes, repaired = parse_changes('[{"file": "a.py", "action": "create", "content": "x = 1"}]')
+        self.assertEqual(changes, [{'file': 'a.py', 'action': 'create', 'content': 'x = 1'}])
+        self.assertFalse(repaired)
+
+    def test_wrapper_trailing_comma_and_raw_newline(self) -> None:
+        content = '```json\n{"changes": [{"file": "a.py", "action": "create", "content": "x = 1\n"},]}\n```'
+        changes, repaired = parse_changes(content)
+        self.assertEqual(changes[0]['content'], 'x = 1\n')
+        self.assertTrue(repaired)
+
+    def test_truncated_last_element_is_dropped(self) -> None:
+        content = '[{"file": "a.py", "action": "create", "content": "ok"}, {"file": "b.py", "action": "cre'
+        changes, repaired = parse_changes(content)
+        self.assertEqual([change['file'] for change in changes], ['a.py'])
+        self.assertTrue(repaired)
+
+    def test_fence_inside_content(self) -> None:
+        content = '```json\n[{"file": "README.md", "action": "modify", "content": "```py\\ncode\\n```"}]\n```'
+        changes, repaired = parse_changes(content)
+        self.assertEqual(changes[0]['content'], '```py\ncode\n```')
+        # Жадный regex прежнего parse_model_response справлялся с этим сам
+        self.assertFalse(repaired)
+
+    def test_preamble_with_brackets_before_fence(self) -> None:
+        content = 'Вот изменения [см. ниже]:\n```json\n[{"file": "a.py", "action": "create", "content": "x"}]\n```'
+        changes, repaired = parse_changes(content)
+        self.assertEqual(changes, [{'file': 'a.py', 'action': 'create', 'content': 'x'}])
+        self.assertFalse(repaired)
+
+        broken = 'Вот изменения [см. ниже]:\n```json\n[{"file": "a.py", "action": "create", "content": "x"},]\n```'
+        changes, repaired = parse_changes(broken)
+        self.assertEqual(changes[0]['file'], 'a.py')
+        self.assertTrue(repaired)
+
+    def test_unfenced_json_with_fence_inside_content(self) -> None:
+        items = [{'file': 'README.md', 'action': 'modify', 'content': '```py\ncode\n```'}]
+        changes, repaired = parse_changes(json.dumps(items))
+        self.assertEqual(changes, items)
+        # Прежний regex цеплялся за ``` внутри content и отбрасывал такой ответ
+        self.assertTrue(repaired)
+
+        changes, repaired = parse_changes(json.dumps({'changes': items}))
+        self.assertEqual(changes, items)
+        self.assertTrue(repaired)
+
+    def test_paths_outside_repo_are_dropped(self) -> None:
+        content = json.dumps([
+            {'file': '../x.py', 'action': 'create', 'content': ''},
+            {'file': '/etc/x.py', 'action': 'create', 'content': ''},
+            {'file': 'ok.py', 'action': 'create', 'content': ''},
+        ])
+        changes, _ = parse_changes(content)
+        self.assertEqual([change['file'] for change in changes], ['ok.py'])
+
+    def test_invalid_schema_raises(self) -> None:
+        with self.assertRaises(ValueError):
+            parse_changes('[{"file": "a.py", "action": "rename", "content": ""}]')
+
+
+if __name__ == '__main__':
+    unittest.main()
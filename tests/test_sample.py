@@ -1,7 +1,13 @@
+import json
+import threading
+import time
 import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict
 from unittest.mock import patch
+from urllib.parse import parse_qs, urlparse
 
-from agent.agent_pr_proposer import propose_pr
+from agent.agent_pr_proposer import propose_pr, propose_prs
 
 
 class TestProposePR(unittest.TestCase):
@@ -19,5 +25,140 @@ class TestProposePR(unittest.TestCase):
         self.assertEqual(result['status'], 'failure')
 
 
+class StubGitHubHandler(BaseHTTPRequestHandler):
+    """Локальная заглушка GitHub API: поведение POST /pulls зависит от имени ветки head."""
+    attempts: Dict[str, int] = {}
+    lock = threading.Lock()
+
+    def log_message(self, format, *args) -> None:
+        pass
+
+    def _send(self, status: int, body: str, content_type: str = 'application/json') -> None:
+        payload = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self) -> None:
+        query = parse_qs(urlparse(self.path).query)
+        if query.get('head') == ['owner:lookup-fails']:
+            # Обрыв соединения без ответа — сетевая ошибка на стороне клиента
+            self.close_connection = True
+        elif query.get('head') == ['owner:exists']:
+            self._send(200, json.dumps([{'html_url': 'http://stub/pull/7', 'number': 7}]))
+        else:
+            self._send(200, '[]')
+
+    def do_POST(self) -> None:
+        data = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        head = data['head']
+        with self.lock:
+            self.attempts[head] = self.attempts.get(head, 0) + 1
+            attempt = self.attempts[head]
+
+        if head == 'flaky' and attempt == 1:
+            self._send(502, '<html>Bad Gateway</html>', 'text/html')
+        elif head == 'limited' and attempt == 1:
+            payload = json.dumps({'message': 'You have exceeded a secondary rate limit.'}).encode('utf-8')
+            self.send_response(403)
+            self.send_header('Retry-After', '0')
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+        elif head == 'secondary':
+            self._send(403, json.dumps({'message': 'You have exceeded a secondary rate limit.'}))
+        elif head == 'primary':
+            self.send_response(403)
+            self.send_header('x-ratelimit-remaining', '0')
+            self.send_header('x-ratelimit-reset', str(int(time.time()) + 3600))
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+        elif head == 'long-retry':
+            self.send_response(429)
+            self.send_header('Retry-After', '3600')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+        elif head in ('exists', 'lookup-fails'):
+            self._send(422, json.dumps({
+                'message': 'Validation Failed',
+                'errors': [{'message': 'A pull request already exists for owner:exists.'}]
+            }))
+        elif head == 'broken':
+            self._send(500, 'Internal Server Error', 'text/plain')
+        else:
+            self._send(201, json.dumps({'html_url': f'http://stub/pull/{head}', 'number': 1}))
+
+
+class TestProposePRs(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), StubGitHubHandler)
+        cls.api_url = f'http://127.0.0.1:{cls.server.server_port}'
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self) -> None:
+        StubGitHubHandler.attempts.clear()
+
+    def _specs(self, *heads: str):
+        return [{'owner': 'owner', 'repo': 'repo', 'head': head, 'base': 'main'} for head in heads]
+
+    def test_propose_prs_bulk(self) -> None:
+        results = propose_prs(
+            self._specs('ok', 'flaky', 'limited', 'exists', 'ok'),
+            'token', api_url=self.api_url, backoff_base=0.01
+        )
+        self.assertEqual([r['status'] for r in results], ['success'] * 5)
+        self.assertEqual(results[3]['pr_number'], 7)
+        self.assertEqual(StubGitHubHandler.attempts, {'ok': 1, 'flaky': 2, 'limited': 2, 'exists': 1})
+
+    def test_propose_prs_gives_up_after_retries(self) -> None:
+        results = propose_prs(self._specs('broken'), 'token', api_url=self.api_url, max_retries=2, backoff_base=0.01)
+        self.assertEqual(results[0]['status'], 'failure')
+        self.assertIn('Internal Server Error', results[0]['message'])
+        self.assertEqual(StubGitHubHandler.attempts['broken'], 3)
+
+    def test_propose_prs_does_not_wait_for_long_rate_limits(self) -> None:
+        started = time.monotonic()
+        results = propose_prs(self._specs('primary', 'long-retry'), 'token', api_url=self.api_url, backoff_base=0.01)
+        self.assertEqual([r['status'] for r in results], ['failure', 'failure'])
+        self.assertEqual(StubGitHubHandler.attempts, {'primary': 1, 'long-retry': 1})
+        self.assertLess(time.monotonic() - started, 5)
+
+    def test_propose_prs_secondary_limit_without_retry_after(self) -> None:
+        started = time.monotonic()
+        results = propose_prs(
+            self._specs('secondary'), 'token', api_url=self.api_url, backoff_base=0.01, max_retry_delay=5
+        )
+        self.assertEqual(results[0]['status'], 'failure')
+        self.assertEqual(StubGitHubHandler.attempts, {'secondary': 1})
+        self.assertLess(time.monotonic() - started, 5)
+
+    def test_propose_prs_malformed_spec_keeps_other_results(self) -> None:
+        specs = self._specs('ok') + [{'owner': 'owner', 'repo': 'repo', 'head': 'no-base'}]
+        results = propose_prs(specs, 'token', api_url=self.api_url, backoff_base=0.01)
+        self.assertEqual(results[0]['status'], 'success')
+        self.assertEqual(results[1]['status'], 'failure')
+        self.assertIn('base', results[1]['message'])
+        self.assertNotIn('no-base', StubGitHubHandler.attempts)
+
+    def test_propose_prs_failed_lookup_keeps_other_results(self) -> None:
+        results = propose_prs(self._specs('ok', 'lookup-fails'), 'token', api_url=self.api_url, backoff_base=0.01)
+        self.assertEqual(results[0]['status'], 'success')
+        self.assertEqual(results[1]['status'], 'failure')
+
+    def test_propose_pr_non_json_error_body(self) -> None:
+        result = propose_pr('owner', 'repo', 'broken', 'main', 'token', api_url=self.api_url)
+        self.assertEqual(result['status'], 'failure')
+        self.assertIn('Internal Server Error', result['message'])
+
+
 if __name__ == '__main__':
     unittest.main()
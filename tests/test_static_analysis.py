@@ -0,0 +1,108 @@
+import asyncio
+import io
+import os
+import tarfile
+import tempfile
+import threading
+import unittest
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+
+from agent import static_analysis
+from agent.static_analysis import PROJECT_ROOT, analyze_changes, ensure_final_newlines, fetch_base_tree
+
+# Снимком целевого репозитория в тестах служит сам проект
+BASE_SHA = 'test-base'
+
+
+def analyze(changes, base_sha: str = BASE_SHA):
+    return asyncio.run(analyze_changes(changes, PROJECT_ROOT, base_sha))
+
+
+class TestAnalyzeChanges(unittest.TestCase):
+    def test_non_python_changes_are_skipped(self) -> None:
+        changes = [{'file': 'README.md', 'action': 'modify', 'content': '# title'}]
+        report = analyze(changes)
+        self.assertTrue(report['passed'])
+        self.assertEqual(report['tools'], {})
+
+    def test_lint_failure_is_reported_and_cached(self) -> None:
+        changes = [{'file': 'pkg/bad.py', 'action': 'create', 'content': 'import os\n'}]
+        report = analyze(changes)
+        self.assertFalse(report['passed'])
+        self.assertFalse(report['tools']['flake8']['passed'])
+        self.assertIn('F401', report['tools']['flake8']['output'])
+
+        cached = analyze(changes)
+        self.assertFalse(cached['passed'])
+        self.assertTrue(cached['tools']['flake8']['cached'])
+
+        other_base = analyze(changes, base_sha='other-base')
+        self.assertFalse(other_base['tools']['flake8']['cached'])
+
+    def test_same_basename_in_different_packages(self) -> None:
+        changes = [
+            {'file': 'a/utils.py', 'action': 'create', 'content': 'def f() -> int:\n    return 1\n'},
+            {'file': 'b/utils.py', 'action': 'create', 'content': 'def g() -> int:\n    return 2\n'},
+        ]
+        report = analyze(changes)
+        self.assertTrue(report['passed'], report['tools'])
+
+    def test_project_imports_are_resolved(self) -> None:
+        changes = [{'file': 'agent/new_mod.py', 'action': 'create', 'content': 'from agent.utils import nothing_here\n\nprint(nothing_here)\n'}]
+        report = analyze(changes)
+        self.assertFalse(report['tools']['mypy']['passed'])
+        self.assertIn('nothing_here', report['tools']['mypy']['output'])
+
+    def test_timeout_is_not_cached(self) -> None:
+        changes = [{'file': 'slow.py', 'action': 'create', 'content': 'SLOW = 1\n'}]
+        with patch('agent.static_analysis.ANALYSIS_TIMEOUT', 0):
+            report = analyze(changes)
+        self.assertFalse(report['passed'])
+        self.assertFalse(report['tools']['flake8']['finished'])
+
+        report = analyze(changes)
+        self.assertTrue(report['passed'])
+        self.assertFalse(report['tools']['flake8']['cached'])
+
+    def test_missing_final_newline_is_added(self) -> None:
+        changes = ensure_final_newlines([{'file': 'nl.py', 'action': 'create', 'content': 'x = 1'}])
+        self.assertEqual(changes[0]['content'], 'x = 1\n')
+        self.assertTrue(analyze(changes)['passed'])
+
+    def test_result_cache_is_bounded(self) -> None:
+        with patch('agent.static_analysis.MAX_CACHE_ENTRIES', 3):
+            analyze([{'file': 'lru_a.py', 'action': 'create', 'content': 'A = 1\n'}])
+            analyze([{'file': 'lru_b.py', 'action': 'create', 'content': 'B = 1\n'}])
+            self.assertLessEqual(len(static_analysis._RESULT_CACHE), 3)
+
+
+class TestFetchBaseTree(unittest.TestCase):
+    def test_tarball_is_extracted_without_top_level_dir(self) -> None:
+        with tempfile.TemporaryDirectory() as served, tempfile.TemporaryDirectory() as bases:
+            with tarfile.open(os.path.join(served, 'base.tar.gz'), 'w:gz') as tar:
+                data = b'VALUE = 1\n'
+                info = tarfile.TarInfo('owner-repo-abc123/pkg/mod.py')
+                info.size = len(data)
+                tar.addfile(info, io.BytesIO(data))
+
+            handler = partial(SimpleHTTPRequestHandler, directory=served)
+            handler.log_message = lambda *args: None  # type: ignore[assignment]
+            server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            try:
+                url = f'http://127.0.0.1:{server.server_port}/base.tar.gz'
+                with patch('agent.static_analysis.BASE_TREES_DIR', bases):
+                    base_dir = asyncio.run(fetch_base_tree(url, 'abc123'))
+            finally:
+                server.shutdown()
+                server.server_close()
+
+            self.assertEqual(base_dir, os.path.join(bases, 'abc123'))
+            with open(os.path.join(base_dir, 'pkg', 'mod.py')) as f:
+                self.assertEqual(f.read(), 'VALUE = 1\n')
+
+
+if __name__ == '__main__':
+    unittest.main()